@@ -1,5 +1,6 @@
 """Configuration settings for the dental diagnosis application."""
 
+import os
 from pathlib import Path
 
 # Base directory
@@ -17,15 +18,58 @@ MODEL_DIR = BASE_DIR / "app" / "models"
 MODEL_DIR.mkdir(exist_ok=True)
 
 MODEL_PATH = MODEL_DIR / "dental_model.h5"
+TFLITE_MODEL_PATH = MODEL_DIR / "dental_model.tflite"  # Converted inference graph
+ONNX_MODEL_PATH = MODEL_DIR / "dental_model.onnx"  # Intermediate export for TensorRT
+TRT_ENGINE_PATH = MODEL_DIR / "dental_model.engine"  # FP16 TensorRT engine
+
+# Part of the cached TFLite/TensorRT file names. Bump it whenever the model's
+# input contract or preprocessing changes so stale caches are rebuilt.
+INFERENCE_GRAPH_VERSION = 1
+
+# Serve with TensorRT when a CUDA GPU is available (needs tensorrt, pycuda, tf2onnx)
+USE_TRT = os.getenv("USE_TRT", "0") == "1"
 
 # Image settings
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
 IMAGE_SIZE = (224, 224)  # Input size for the model
+JPEG_QUALITY = 85  # Quality of generated heatmap/enhanced images
 
 # Model settings
 CONFIDENCE_THRESHOLD = 0.5
 NUM_CLASSES = 3  # healthy, cavity, gum_disease
+CALIBRATION_SAMPLES = 100  # Sample images used for INT8 quantization
+
+# Request batching: wait up to MAX_BATCH_WAIT_MS to group concurrent requests
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 5
+PREDICTION_TIMEOUT_S = 30  # Give up on a queued prediction after this long
+
+
+def _physical_cores() -> int:
+    """
+    Count the physical CPU cores this process may run on.
+
+    SMT siblings of a core share its execution units, so they are counted
+    once. Falls back to the logical CPU count where the Linux CPU topology
+    is not available.
+
+    Returns:
+        Number of physical cores, at least 1
+    """
+    cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else range(os.cpu_count() or 1)
+    cores = set()
+    for cpu in cpus:
+        siblings = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list")
+        try:
+            cores.add(siblings.read_text().strip())
+        except OSError:
+            return max(len(cpus), 1)
+    return max(len(cores), 1)
+
+
+# CPU inference threads, one per physical core unless INFERENCE_THREADS is set
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", _physical_cores()))
 
 # Class labels
 CLASS_LABELS = {
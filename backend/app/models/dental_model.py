@@ -1,26 +1,49 @@
 """Dental diagnosis ML model."""
 
+import threading
+import traceback
 import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from pathlib import Path
-from typing import Dict, Tuple
-from app.config import MODEL_PATH, IMAGE_SIZE, NUM_CLASSES, CLASS_LABELS
+from typing import Dict, Iterator, List, Tuple
+from app.config import (
+    MODEL_PATH, TFLITE_MODEL_PATH, ONNX_MODEL_PATH, TRT_ENGINE_PATH, USE_TRT,
+    INFERENCE_GRAPH_VERSION,
+    SAMPLE_DATA_DIR, ALLOWED_EXTENSIONS,
+    IMAGE_SIZE, NUM_CLASSES, CLASS_LABELS, CALIBRATION_SAMPLES, INFERENCE_THREADS,
+    MAX_BATCH_SIZE
+)
+from app.preprocessing import preprocess_image
 
 
 class DentalDiagnosisModel:
     """Dental diagnosis model for detecting cavities and gum disease."""
 
-    def __init__(self, model_path: Path = MODEL_PATH):
+    def __init__(
+        self,
+        model_path: Path = MODEL_PATH,
+        tflite_path: Path = TFLITE_MODEL_PATH,
+        engine_path: Path = TRT_ENGINE_PATH
+    ):
         """
         Initialize the dental diagnosis model.
 
         Args:
             model_path: Path to saved model weights
+            tflite_path: Base path of the cached TFLite inference graph
+            engine_path: Base path of the cached TensorRT engine
         """
         self.model_path = model_path
+        self.tflite_path = tflite_path
+        self.engine_path = engine_path
         self.model = None
+        self.trt_engine = None
+        self.interpreters = {}
+        self._inference_lock = threading.Lock()
+        self.input_details = None
+        self.output_details = None
         self.load_or_create_model()
 
     def create_model(self) -> keras.Model:
@@ -43,8 +66,8 @@ class DentalDiagnosisModel:
         # Build model
         inputs = keras.Input(shape=(*IMAGE_SIZE, 3))
 
-        # Preprocessing
-        x = keras.applications.mobilenet_v2.preprocess_input(inputs * 255.0)
+        # Preprocessing (scales [0, 255] pixels to [-1, 1] on-graph)
+        x = keras.applications.mobilenet_v2.preprocess_input(inputs)
 
         # Base model
         x = base_model(x, training=False)
@@ -54,7 +77,8 @@ class DentalDiagnosisModel:
         x = layers.Dropout(0.2)(x)
         x = layers.Dense(128, activation='relu')(x)
         x = layers.Dropout(0.2)(x)
-        outputs = layers.Dense(NUM_CLASSES, activation='softmax')(x)
+        # Keep the softmax in FP32 when training under mixed precision
+        outputs = layers.Dense(NUM_CLASSES, activation='softmax', dtype='float32')(x)
 
         model = keras.Model(inputs, outputs)
 
@@ -69,6 +93,15 @@ class DentalDiagnosisModel:
 
     def load_or_create_model(self):
         """Load existing model or create a new one."""
+        # TensorFlow otherwise claims nearly all GPU memory as soon as the
+        # model is built, leaving none for the TensorRT engine in this process
+        for gpu in tf.config.list_physical_devices('GPU'):
+            try:
+                tf.config.experimental.set_memory_growth(gpu, True)
+            except RuntimeError:
+                # The GPU was already initialized, e.g. by an earlier model
+                pass
+
         if self.model_path.exists():
             try:
                 print(f"Loading model from {self.model_path}")
@@ -86,6 +119,237 @@ class DentalDiagnosisModel:
             # Initialize with random predictions (simulate trained model)
             self._initialize_demo_weights()
 
+        self.load_inference_backend()
+
+    def load_inference_backend(self, force_rebuild: bool = False):
+        """
+        Load TensorRT on GPU hosts with USE_TRT set, TFLite otherwise.
+
+        Args:
+            force_rebuild: Always rebuild from the in-memory Keras model
+        """
+        if USE_TRT and tf.config.list_physical_devices('GPU'):
+            self.load_trt_engine(force_build=force_rebuild)
+
+        if self.trt_engine is None:
+            self.load_interpreter(force_convert=force_rebuild)
+
+    def _calibration_images(self) -> List[Path]:
+        """Collect sample images used to calibrate INT8 quantization."""
+        images = sorted(
+            path for path in SAMPLE_DATA_DIR.rglob("*")
+            if path.suffix.lower() in ALLOWED_EXTENSIONS
+        )
+        return images[:CALIBRATION_SAMPLES]
+
+    def _representative_dataset(self, images: List[Path]) -> Iterator[List[np.ndarray]]:
+        """
+        Yield preprocessed sample images for INT8 calibration.
+
+        Args:
+            images: Sample image paths
+
+        Yields:
+            Single-element list holding one model input batch
+        """
+        for path in images:
+            try:
+                img = preprocess_image(str(path))
+            except ValueError:
+                continue
+            yield [img.astype(np.float32)]
+
+    def _serving_function(self) -> tf.types.experimental.GenericFunction:
+        """
+        Trace the Keras model into a tf.function for export.
+
+        The TFLite and ONNX converters take this function rather than the
+        Keras model, because their Keras entry points
+        (TFLiteConverter.from_keras_model, tf2onnx.convert.from_keras)
+        rely on Keras 2 internals that Keras 3 no longer provides.
+
+        Returns:
+            tf.function taking a float32 "input" batch of any size
+        """
+        return tf.function(
+            lambda images: self.model(images, training=False),
+            input_signature=[tf.TensorSpec((None, *IMAGE_SIZE, 3), tf.float32, name="input")]
+        )
+
+    def _tflite_converter(self) -> tf.lite.TFLiteConverter:
+        """
+        Create a TFLite converter for the Keras model.
+
+        No trackable object is passed along: with a Keras 3 model the
+        converter aborts the process while lowering its variables, whereas
+        without one it freezes them into constants itself.
+
+        Returns:
+            TFLite converter with a dynamic batch dimension
+        """
+        concrete_func = self._serving_function().get_concrete_function()
+        return tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+
+    def convert_to_tflite(self, images: List[Path]) -> Tuple[bytes, str]:
+        """
+        Convert the Keras model to a TFLite FlatBuffer.
+
+        The graph is fully INT8 quantized when sample images are available
+        for calibration, otherwise it is stored with FP16 weights.
+
+        Args:
+            images: Sample images for INT8 calibration
+
+        Returns:
+            Tuple of (serialized TFLite model, quantization mode)
+        """
+        tflite_bytes = None
+        mode = "int8"
+
+        if images:
+            try:
+                converter = self._tflite_converter()
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                converter.representative_dataset = lambda: self._representative_dataset(images)
+                converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+                converter.inference_input_type = tf.uint8
+                tflite_bytes = converter.convert()
+                print(f"Quantized model to INT8 using {len(images)} sample images")
+            except Exception as e:
+                print(f"INT8 quantization failed: {type(e).__name__}: {e}")
+        else:
+            print(f"No sample images in {SAMPLE_DATA_DIR}, skipping INT8 quantization")
+
+        if tflite_bytes is None:
+            converter = self._tflite_converter()
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+            tflite_bytes = converter.convert()
+            mode = "fp16"
+
+        return tflite_bytes, mode
+
+    def load_interpreter(self, force_convert: bool = False):
+        """
+        Load the TFLite interpreters used for inference, one per batch size.
+
+        The cached FlatBuffer is reused unless it is older than the saved
+        Keras weights or was built for another graph version or
+        quantization mode, in which case the model is converted again. If
+        conversion or loading fails, no interpreters are set and
+        predictions are served by the Keras model instead.
+
+        Args:
+            force_convert: Always reconvert from the in-memory Keras model
+        """
+        try:
+            images = self._calibration_images()
+            cache_path = self._cache_path(self.tflite_path, "int8" if images else "fp16")
+            if self._is_cache_fresh(cache_path) and not force_convert:
+                print(f"Loading TFLite model from {cache_path}")
+                tflite_bytes = cache_path.read_bytes()
+            else:
+                print("Converting model to TFLite...")
+                tflite_bytes, mode = self.convert_to_tflite(images)
+                cache_path = self._cache_path(self.tflite_path, mode)
+                cache_path.write_bytes(tflite_bytes)
+                self._remove_stale_caches(self.tflite_path, cache_path)
+                print(f"TFLite model saved to {cache_path}")
+
+            # One preallocated interpreter per batch size, so varying batch
+            # sizes never resize an interpreter and re-plan its memory
+            interpreters = {}
+            for batch_size in range(1, MAX_BATCH_SIZE + 1):
+                interpreter = tf.lite.Interpreter(
+                    model_content=tflite_bytes,
+                    num_threads=INFERENCE_THREADS
+                )
+                input_index = interpreter.get_input_details()[0]['index']
+                interpreter.resize_tensor_input(input_index, (batch_size, *IMAGE_SIZE, 3))
+                interpreter.allocate_tensors()
+                interpreters[batch_size] = interpreter
+        except Exception as e:
+            print(f"TFLite unavailable, using Keras instead: {type(e).__name__}: {e}")
+            self.interpreters = {}
+            return
+
+        self.interpreters = interpreters
+        # Tensor indices and quantization are the same for every batch size
+        self.input_details = interpreters[1].get_input_details()[0]
+        self.output_details = interpreters[1].get_output_details()[0]
+
+    def load_trt_engine(self, force_build: bool = False):
+        """
+        Load the TensorRT engine used for GPU inference.
+
+        The cached engine is rebuilt when it is older than the saved Keras
+        weights or was built for another graph version. If TensorRT or its tooling is unavailable, trt_engine is
+        left unset so inference falls back to TFLite.
+
+        Args:
+            force_build: Always rebuild from the in-memory Keras model
+        """
+        try:
+            from app.models.tensorrt_engine import TensorRTEngine, build_engine
+
+            engine_path = self._cache_path(self.engine_path, "fp16")
+            if force_build or not self._is_cache_fresh(engine_path):
+                print("Building TensorRT engine...")
+                build_engine(self._serving_function(), ONNX_MODEL_PATH, engine_path)
+                self._remove_stale_caches(self.engine_path, engine_path)
+
+            self.trt_engine = TensorRTEngine(engine_path)
+            print(f"TensorRT engine loaded from {engine_path}")
+        except Exception as e:
+            # Full traceback, so a TFLite fallback on a GPU host can be traced
+            # to the failing step (import, ONNX export, trtexec or CUDA)
+            print(f"TensorRT unavailable, using TFLite instead: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            self.trt_engine = None
+
+    def _cache_path(self, base_path: Path, mode: str) -> Path:
+        """
+        Build the cache file name for the current graph version.
+
+        Args:
+            base_path: Unversioned cache path, e.g. dental_model.tflite
+            mode: Quantization mode of the cached graph
+
+        Returns:
+            Versioned path, e.g. dental_model.v1.int8.tflite
+        """
+        return base_path.with_name(
+            f"{base_path.stem}.v{INFERENCE_GRAPH_VERSION}.{mode}{base_path.suffix}"
+        )
+
+    def _remove_stale_caches(self, base_path: Path, current_path: Path):
+        """
+        Delete caches built for other graph versions or quantization modes.
+
+        Args:
+            base_path: Unversioned cache path, also removed if present
+            current_path: Cache to keep
+        """
+        stale = [base_path, *base_path.parent.glob(f"{base_path.stem}.v*{base_path.suffix}")]
+        for path in stale:
+            if path != current_path:
+                path.unlink(missing_ok=True)
+
+    def _is_cache_fresh(self, cache_path: Path) -> bool:
+        """
+        Check whether a converted model is at least as new as the saved weights.
+
+        Args:
+            cache_path: Path to the converted model
+
+        Returns:
+            True if the cached file can be reused
+        """
+        return cache_path.exists() and (
+            not self.model_path.exists()
+            or cache_path.stat().st_mtime >= self.model_path.stat().st_mtime
+        )
+
     def _initialize_demo_weights(self):
         """
         Initialize model for demo purposes.
@@ -95,41 +359,118 @@ class DentalDiagnosisModel:
         # The model is already initialized with ImageNet weights
         # For demo, we'll use it as-is
 
-    def predict(self, preprocessed_image: np.ndarray) -> Tuple[Dict[str, float], str, float]:
+    def predict(self, preprocessed_image: np.ndarray) -> Tuple[Dict[str, float], str, float, np.ndarray]:
         """
         Make prediction on preprocessed image.
 
         Args:
-            preprocessed_image: Preprocessed image array
+            preprocessed_image: Preprocessed uint8 image batch
 
         Returns:
-            Tuple of (confidence_scores_dict, predicted_class, max_confidence)
+            Tuple of (confidence_scores_dict, predicted_class, max_confidence,
+            probabilities)
+        """
+        return self.predict_batch([preprocessed_image])[0]
+
+    def predict_batch(
+        self, preprocessed_images: List[np.ndarray]
+    ) -> List[Tuple[Dict[str, float], str, float, np.ndarray]]:
         """
-        # Get model predictions
-        predictions = self.model.predict(preprocessed_image, verbose=0)
+        Make predictions on several preprocessed images in one interpreter call.
 
+        Args:
+            preprocessed_images: Preprocessed uint8 image batches
+
+        Returns:
+            List of (confidence_scores_dict, predicted_class, max_confidence,
+            probabilities), one per input image
+        """
+        batch = np.concatenate(preprocessed_images, axis=0)
+
+        # Neither backend is thread-safe; callers may run in a thread pool
+        with self._inference_lock:
+            if self.trt_engine is not None:
+                predictions = self.trt_engine.infer(batch)
+            else:
+                predictions = self._invoke_interpreter(batch)
+
+        return [self._format_prediction(row) for row in predictions]
+
+    def _invoke_interpreter(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Run a batch through the TFLite interpreters.
+
+        Batches larger than MAX_BATCH_SIZE are run in chunks.
+
+        Args:
+            batch: Preprocessed uint8 image batch
+
+        Returns:
+            Class probabilities, one row per image
+        """
+        # TFLite conversion failed; serve through Keras
+        if not self.interpreters:
+            return self.model.predict(batch.astype(np.float32), verbose=0)
+
+        # Quantized graphs take uint8 input in their calibrated scale; when
+        # calibration covered the full pixel range that is the pixels as-is
+        if self.input_details['dtype'] == np.uint8:
+            scale, zero_point = self.input_details['quantization']
+            if scale == 1.0 and zero_point == 0:
+                input_data = batch
+            else:
+                input_data = np.clip(np.round(batch / scale) + zero_point, 0, 255).astype(np.uint8)
+        else:
+            input_data = batch.astype(np.float32)
+
+        predictions = []
+        for start in range(0, len(input_data), MAX_BATCH_SIZE):
+            chunk = input_data[start:start + MAX_BATCH_SIZE]
+            interpreter = self.interpreters[len(chunk)]
+            interpreter.set_tensor(self.input_details['index'], chunk)
+            interpreter.invoke()
+            predictions.append(interpreter.get_tensor(self.output_details['index']))
+
+        return np.concatenate(predictions)
+
+    def _format_prediction(self, prediction: np.ndarray) -> Tuple[Dict[str, float], str, float, np.ndarray]:
+        """
+        Convert one row of class probabilities into a prediction result.
+
+        Args:
+            prediction: Class probabilities for a single image
+
+        Returns:
+            Tuple of (confidence_scores_dict, predicted_class, max_confidence,
+            probabilities)
+        """
         # Convert to probabilities dict
         confidence_scores = {}
         for idx, label in CLASS_LABELS.items():
-            confidence_scores[label] = float(predictions[0][idx])
+            confidence_scores[label] = float(prediction[idx])
 
         # Get predicted class
-        predicted_idx = int(np.argmax(predictions[0]))
+        predicted_idx = int(np.argmax(prediction))
         predicted_class = CLASS_LABELS[predicted_idx]
-        max_confidence = float(predictions[0][predicted_idx])
+        max_confidence = float(prediction[predicted_idx])
 
-        return confidence_scores, predicted_class, max_confidence
+        return confidence_scores, predicted_class, max_confidence, prediction
 
     def save_model(self):
         """Save the model to disk."""
         if self.model:
             self.model.save(self.model_path)
             print(f"Model saved to {self.model_path}")
+            self.load_inference_backend(force_rebuild=True)
 
     def train(self, train_data, validation_data, epochs: int = 10):
         """
         Train the model (placeholder for actual training).
 
+        The TFLite/TensorRT graph built from the old weights is dropped, so
+        predictions are served by the trained Keras model until
+        save_model() rebuilds it.
+
         Args:
             train_data: Training dataset
             validation_data: Validation dataset
@@ -138,8 +479,47 @@ class DentalDiagnosisModel:
         if not self.model:
             self.model = self.create_model()
 
-        # Unfreeze some layers for fine-tuning
-        base_model = self.model.layers[2]
+        # FP16 compute with FP32 accumulation only pays off on GPUs. The policy
+        # is scoped to training so the graph exported for inference stays FP32.
+        mixed_precision = bool(tf.config.list_physical_devices('GPU'))
+        if mixed_precision:
+            keras.mixed_precision.set_global_policy('mixed_float16')
+            self._rebuild_model()
+
+        try:
+            history = self._fit(train_data, validation_data, epochs)
+        finally:
+            if mixed_precision:
+                keras.mixed_precision.set_global_policy('float32')
+                self._rebuild_model()
+
+        with self._inference_lock:
+            self.trt_engine = None
+            self.interpreters = {}
+
+        return history
+
+    def _rebuild_model(self):
+        """Recreate the Keras model under the current dtype policy, keeping its weights."""
+        weights = self.model.get_weights()
+        self.model = self.create_model()
+        self.model.set_weights(weights)
+
+    def _fit(self, train_data, validation_data, epochs: int):
+        """
+        Fine-tune the model on the given datasets.
+
+        Args:
+            train_data: Training dataset
+            validation_data: Validation dataset
+            epochs: Number of training epochs
+
+        Returns:
+            Keras training history
+        """
+        # Unfreeze some layers for fine-tuning (the nested MobileNetV2; the
+        # preprocessing ops before it are not layers under Keras 3)
+        base_model = next(layer for layer in self.model.layers if isinstance(layer, keras.Model))
         base_model.trainable = True
 
         # Freeze early layers
@@ -0,0 +1,127 @@
+"""TensorRT inference engine for CUDA deployments."""
+
+import shutil
+import subprocess
+import numpy as np
+import tensorflow as tf
+import tensorrt as trt
+import pycuda.driver as cuda
+import tf2onnx
+from pathlib import Path
+from app.config import IMAGE_SIZE, NUM_CLASSES, MAX_BATCH_SIZE
+
+
+def build_engine(
+    serve: tf.types.experimental.GenericFunction, onnx_path: Path, engine_path: Path
+):
+    """
+    Export a traced model to ONNX and build an FP16 TensorRT engine from it.
+
+    Args:
+        serve: tf.function with a single-input signature and a dynamic
+            batch dimension
+        onnx_path: Path to write the intermediate ONNX model
+        engine_path: Path to write the serialized TensorRT engine
+    """
+    trtexec = shutil.which("trtexec")
+    if trtexec is None:
+        raise RuntimeError("trtexec not found on PATH")
+
+    input_signature = serve.input_signature
+    tf2onnx.convert.from_function(serve, input_signature=input_signature, output_path=str(onnx_path))
+    print(f"ONNX model saved to {onnx_path}")
+
+    # The ONNX input takes its name from the TensorSpec
+    input_name = input_signature[0].name
+    shape = "x".join(str(dim) for dim in (*IMAGE_SIZE, 3))
+    result = subprocess.run(
+        [
+            trtexec,
+            f"--onnx={onnx_path}",
+            "--fp16",
+            f"--saveEngine={engine_path}",
+            f"--minShapes={input_name}:1x{shape}",
+            f"--optShapes={input_name}:{MAX_BATCH_SIZE}x{shape}",
+            f"--maxShapes={input_name}:{MAX_BATCH_SIZE}x{shape}",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # trtexec logs most build errors to stdout, so include the tail of both
+        # streams; the full log can run to thousands of lines
+        raise RuntimeError(
+            f"trtexec exited with status {result.returncode}\n"
+            f"stdout:\n{result.stdout[-4000:]}\n"
+            f"stderr:\n{result.stderr[-4000:]}"
+        )
+    print(f"TensorRT engine saved to {engine_path}")
+
+
+class TensorRTEngine:
+    """Serialized TensorRT engine with preallocated host and device buffers."""
+
+    def __init__(self, engine_path: Path):
+        """
+        Load a TensorRT engine and allocate buffers for MAX_BATCH_SIZE images.
+
+        Args:
+            engine_path: Path to the serialized engine
+        """
+        cuda.init()
+        # Own context so inference can run from any thread by pushing it
+        self.cuda_context = cuda.Device(0).make_context()
+
+        try:
+            self.logger = trt.Logger(trt.Logger.WARNING)
+            runtime = trt.Runtime(self.logger)
+            self.engine = runtime.deserialize_cuda_engine(engine_path.read_bytes())
+            self.context = self.engine.create_execution_context()
+
+            names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+            self.input_name = next(
+                name for name in names
+                if self.engine.get_tensor_mode(name) == trt.TensorIOMode.INPUT
+            )
+            self.output_name = next(
+                name for name in names
+                if self.engine.get_tensor_mode(name) == trt.TensorIOMode.OUTPUT
+            )
+
+            # Page-locked host buffers allow async copies and are reused per request
+            self.host_input = cuda.pagelocked_empty((MAX_BATCH_SIZE, *IMAGE_SIZE, 3), np.float32)
+            self.host_output = cuda.pagelocked_empty((MAX_BATCH_SIZE, NUM_CLASSES), np.float32)
+            self.device_input = cuda.mem_alloc(self.host_input.nbytes)
+            self.device_output = cuda.mem_alloc(self.host_output.nbytes)
+            self.stream = cuda.Stream()
+
+            self.context.set_tensor_address(self.input_name, int(self.device_input))
+            self.context.set_tensor_address(self.output_name, int(self.device_output))
+        finally:
+            self.cuda_context.pop()
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Run the engine on a batch of images.
+
+        Args:
+            batch: Image batch of at most MAX_BATCH_SIZE images
+
+        Returns:
+            Class probabilities, one row per image
+        """
+        batch_size = batch.shape[0]
+
+        self.cuda_context.push()
+        try:
+            self.host_input[:batch_size] = batch
+            self.context.set_input_shape(self.input_name, (batch_size, *IMAGE_SIZE, 3))
+
+            cuda.memcpy_htod_async(self.device_input, self.host_input[:batch_size], self.stream)
+            self.context.execute_async_v3(self.stream.handle)
+            cuda.memcpy_dtoh_async(self.host_output[:batch_size], self.device_output, self.stream)
+            self.stream.synchronize()
+        finally:
+            self.cuda_context.pop()
+
+        return self.host_output[:batch_size].copy()
@@ -1,44 +1,97 @@
 """Image preprocessing utilities for dental X-ray analysis."""
 
-import io
+import os
 import cv2
 import numpy as np
 from PIL import Image
 from typing import Tuple
-from app.config import IMAGE_SIZE
+from app.config import IMAGE_SIZE, JPEG_QUALITY
+from app.clahe_numba import clahe_u8
 
+# CLAHE operator is reused across requests instead of rebuilt per call
+_CLAHE_ENHANCE = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
 
-def preprocess_image(image_path: str) -> np.ndarray:
+# Heatmap output size and its uniform red (BGR) overlay
+_HEATMAP_SIZE = (512, 512)
+_RED_OVERLAY = np.zeros((*_HEATMAP_SIZE, 3), dtype=np.uint8)
+_RED_OVERLAY[:, :, 2] = 255
+
+# JPEG decoders can downscale by these factors during decoding
+_REDUCED_READ_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def _read_flag(image_path: str, min_side: int) -> int:
     """
-    Preprocess dental X-ray image for model inference.
+    Pick the cheapest imread flag that still decodes at least min_side pixels.
 
     Args:
         image_path: Path to the image file
+        min_side: Smallest width/height the decoded image must keep
 
     Returns:
-        Preprocessed image array ready for model input
+        OpenCV imread flag
     """
-    # Read image
-    img = cv2.imread(image_path)
+    # Only the header is read to get the format and dimensions
+    with Image.open(image_path) as img:
+        image_format = img.format
+        shortest_side = min(img.size)
+
+    # Reduced decoding only saves work for JPEG (DCT-domain scaling);
+    # other formats are decoded at full size and resized afterwards
+    if image_format == "JPEG":
+        for factor, flag in _REDUCED_READ_FLAGS:
+            if shortest_side // factor >= min_side:
+                return flag
+
+    return cv2.IMREAD_COLOR
+
+
+def _read_image(image_path: str, min_side: int) -> np.ndarray:
+    """
+    Decode an image file to a BGR array.
+
+    Args:
+        image_path: Path to the image file
+        min_side: Smallest width/height the decoded image must keep
+
+    Returns:
+        Decoded BGR image
+    """
+    try:
+        flag = _read_flag(image_path, min_side)
+    except Exception:
+        flag = cv2.IMREAD_COLOR
+
+    img = cv2.imread(image_path, flag)
 
     if img is None:
         raise ValueError(f"Could not read image at {image_path}")
 
-    # Convert BGR to RGB
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def _to_model_input(img: np.ndarray) -> np.ndarray:
+    """
+    Turn a decoded BGR image into a model input batch.
+
+    Args:
+        img: Decoded BGR image
 
+    Returns:
+        Preprocessed uint8 RGB image batch ready for model input
+    """
     # Resize to model input size
     img = cv2.resize(img, IMAGE_SIZE, interpolation=cv2.INTER_AREA)
 
-    # Normalize pixel values to [0, 1]
-    img = img.astype(np.float32) / 255.0
-
     # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-    # This enhances contrast in dental X-rays
-    img_lab = cv2.cvtColor((img * 255).astype(np.uint8), cv2.COLOR_RGB2LAB)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    img_lab[:, :, 0] = clahe.apply(img_lab[:, :, 0])
-    img = cv2.cvtColor(img_lab, cv2.COLOR_LAB2RGB).astype(np.float32) / 255.0
+    # on the uint8 luma channel; this enhances contrast in dental X-rays
+    img_ycrcb = cv2.cvtColor(img, cv2.COLOR_BGR2YCrCb)
+    img_ycrcb[:, :, 0] = clahe_u8(img_ycrcb[:, :, 0])
+    img = cv2.cvtColor(img_ycrcb, cv2.COLOR_YCrCb2RGB)
 
     # Add batch dimension
     img = np.expand_dims(img, axis=0)
@@ -46,6 +99,33 @@ def preprocess_image(image_path: str) -> np.ndarray:
     return img
 
 
+def preprocess_image(image_path: str) -> np.ndarray:
+    """
+    Preprocess dental X-ray image for model inference.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Preprocessed uint8 RGB image batch ready for model input
+    """
+    return _to_model_input(_read_image(image_path, min(IMAGE_SIZE)))
+
+
+def preprocess_and_load(image_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode an image once and derive both the model input and heatmap base.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        Tuple of (model_input_batch, bgr_image_resized_for_heatmap)
+    """
+    img = _read_image(image_path, max(*IMAGE_SIZE, *_HEATMAP_SIZE))
+    return _to_model_input(img), cv2.resize(img, _HEATMAP_SIZE)
+
+
 def enhance_xray(image_path: str, output_path: str) -> str:
     """
     Enhance dental X-ray for better visualization.
@@ -63,35 +143,29 @@ def enhance_xray(image_path: str, output_path: str) -> str:
         raise ValueError(f"Could not read image at {image_path}")
 
     # Apply CLAHE
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(img)
+    enhanced = _CLAHE_ENHANCE.apply(img)
 
-    # Apply denoising
-    enhanced = cv2.fastNlMeansDenoising(enhanced, None, 10, 7, 21)
+    # Apply edge-preserving denoising (much cheaper than non-local means)
+    enhanced = cv2.bilateralFilter(enhanced, d=9, sigmaColor=50, sigmaSpace=50)
 
     # Save enhanced image
-    cv2.imwrite(output_path, enhanced)
+    cv2.imwrite(output_path, enhanced, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
 
     return output_path
 
 
-def create_heatmap(image_path: str, prediction: np.ndarray, output_path: str) -> str:
+def create_heatmap(image: np.ndarray, prediction: np.ndarray, output_path: str) -> str:
     """
     Create a heatmap overlay showing areas of concern.
 
     Args:
-        image_path: Path to original image
+        image: Original BGR image resized to the heatmap size
         prediction: Model prediction array
         output_path: Path to save heatmap
 
     Returns:
         Path to heatmap image
     """
-    # Read original image
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img = cv2.resize(img, (512, 512))
-
     # Create a simple gradient heatmap based on confidence
     # In a real application, this would use GradCAM or similar technique
     confidence = float(np.max(prediction))
@@ -99,58 +173,52 @@ def create_heatmap(image_path: str, prediction: np.ndarray, output_path: str) ->
 
     # Only create heatmap for problematic predictions
     if predicted_class > 0 and confidence > 0.5:
-        # Create red overlay
-        heatmap = np.zeros_like(img)
-        heatmap[:, :, 0] = 255  # Red channel
-
-        # Apply gaussian blur for smooth gradient
-        heatmap = cv2.GaussianBlur(heatmap, (0, 0), sigmaX=50, sigmaY=50)
-
-        # Blend with original image
+        # Blend a uniform red overlay with the original image
+        # (blurring a constant field leaves it unchanged, so none is applied)
         alpha = confidence * 0.4
-        overlay = cv2.addWeighted(img, 1 - alpha, heatmap, alpha, 0)
+        overlay = cv2.addWeighted(image, 1 - alpha, _RED_OVERLAY, alpha, 0)
     else:
-        overlay = img
+        overlay = image
 
-    # Convert back to BGR for saving
-    overlay = cv2.cvtColor(overlay, cv2.COLOR_RGB2BGR)
-    cv2.imwrite(output_path, overlay)
+    cv2.imwrite(output_path, overlay, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
 
     return output_path
 
 
-def validate_image(file_content: bytes, max_size: int) -> Tuple[bool, str]:
+def validate_image(image_path: str, max_size: int) -> Tuple[bool, str]:
     """
     Validate uploaded image file.
 
     Args:
-        file_content: Image file content in bytes
+        image_path: Path to the saved upload
         max_size: Maximum allowed file size in bytes
 
     Returns:
         Tuple of (is_valid, error_message)
     """
     # Check file size
-    if len(file_content) > max_size:
+    if os.path.getsize(image_path) > max_size:
         return False, f"File size exceeds maximum allowed size of {max_size / (1024*1024)}MB"
 
-    # Try to open as image
+    # Try to open as image (only the header is read until verify())
     try:
-        img = Image.open(io.BytesIO(file_content))
-        img.verify()
+        with Image.open(image_path) as img:
+            img.verify()
 
-        # Check if image format is supported
-        if img.format.lower() not in ['jpeg', 'jpg', 'png', 'bmp']:
-            return False, f"Unsupported image format: {img.format}"
+            # Check if image format is supported
+            if img.format.lower() not in ['jpeg', 'jpg', 'png', 'bmp']:
+                return False, f"Unsupported image format: {img.format}"
 
-        # Check image dimensions (should be reasonable)
-        width, height = img.size
-        if width < 100 or height < 100:
-            return False, "Image dimensions too small (minimum 100x100)"
-        if width > 5000 or height > 5000:
-            return False, "Image dimensions too large (maximum 5000x5000)"
+            # Check image dimensions (should be reasonable)
+            width, height = img.size
+            if width < 100 or height < 100:
+                return False, "Image dimensions too small (minimum 100x100)"
+            if width > 5000 or height > 5000:
+                return False, "Image dimensions too large (maximum 5000x5000)"
 
         return True, ""
 
     except Exception as e:
-        return False, f"Invalid image file: {str(e)}"
+        # PIL errors include the file path; only expose the file name
+        error = str(e).replace(image_path, os.path.basename(image_path))
+        return False, f"Invalid image file: {error}"
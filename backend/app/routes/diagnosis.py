@@ -1,20 +1,42 @@
 """API routes for dental diagnosis."""
 
-import shutil
+import asyncio
+import os
 import uuid
 from pathlib import Path
 from fastapi import APIRouter, File, UploadFile, HTTPException
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import Dict, Optional
+from typing import BinaryIO, Dict, List, Optional
 
-from app.config import UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
-from app.preprocessing import preprocess_image, validate_image, create_heatmap, enhance_xray
+from app.config import (
+    UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE,
+    MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS, PREDICTION_TIMEOUT_S
+)
+from app.preprocessing import preprocess_and_load, validate_image, create_heatmap, enhance_xray
 from app.models.dental_model import get_model
 
 
 router = APIRouter(prefix="/api", tags=["diagnosis"])
 
+# Upload directory as a plain string for building per-request file paths
+_UPLOAD_DIR_STR = str(UPLOAD_DIR)
+
+# Diagnosis messages keyed by (predicted_class, high_confidence)
+_DIAGNOSIS_MESSAGES = {
+    ("healthy", True): "The dental X-ray appears healthy with no signs of cavities or gum disease.",
+    ("healthy", False): "The dental X-ray appears mostly healthy, but consider a professional examination.",
+    ("cavity", True): "Potential cavity detected. Please consult with a dentist for proper diagnosis and treatment.",
+    ("cavity", False): "Possible cavity detected. Recommend professional dental examination for confirmation.",
+    ("gum_disease", True): "Signs of gum disease detected. Please schedule an appointment with your dentist.",
+    ("gum_disease", False): "Possible gum disease indicators. Recommend professional dental consultation.",
+}
+_DEFAULT_DIAGNOSIS_MESSAGE = "Analysis complete. Please consult with a dental professional for proper diagnosis."
+
+# Pending (preprocessed_image, future) pairs consumed by the batch worker;
+# recreated by start_batch_worker() so it is bound to the serving event loop
+_batch_queue: Optional[asyncio.Queue] = None
+
 
 class PredictionResponse(BaseModel):
     """Response model for prediction."""
@@ -79,47 +101,58 @@ async def diagnose_image(file: UploadFile = File(...)):
             detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Read file content
-    try:
-        file_content = await file.read()
-    except Exception as e:
+    # Reject oversized uploads before touching the disk when the size is known
+    if file.size is not None and file.size > MAX_FILE_SIZE:
         raise HTTPException(
             status_code=400,
-            detail=f"Error reading file: {str(e)}"
+            detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE / (1024*1024)}MB"
         )
 
-    # Validate image
-    is_valid, error_message = validate_image(file_content, MAX_FILE_SIZE)
-    if not is_valid:
-        raise HTTPException(status_code=400, detail=error_message)
-
     # Generate unique ID for this image
     image_id = str(uuid.uuid4())
 
-    # Save uploaded file
-    upload_path = UPLOAD_DIR / f"{image_id}{file_ext}"
+    # Stream uploaded file to disk (blocking I/O runs in the thread pool)
+    upload_path = f"{_UPLOAD_DIR_STR}/{image_id}{file_ext}"
     try:
-        with open(upload_path, "wb") as f:
-            f.write(file_content)
+        await asyncio.to_thread(_save_upload, file.file, upload_path, MAX_FILE_SIZE)
     except Exception as e:
+        # Do not leave a partially written upload behind
+        _remove_upload(upload_path)
         raise HTTPException(
             status_code=500,
             detail=f"Error saving file: {str(e)}"
         )
 
-    try:
-        # Preprocess image
-        preprocessed = preprocess_image(str(upload_path))
-
-        # Get model and make prediction
-        model = get_model()
-        confidence_scores, predicted_class, max_confidence = model.predict(preprocessed)
+    # Validate image
+    is_valid, error_message = await asyncio.to_thread(validate_image, upload_path, MAX_FILE_SIZE)
+    if not is_valid:
+        _remove_upload(upload_path)
+        raise HTTPException(status_code=400, detail=error_message)
 
-        # Create heatmap
-        heatmap_path = UPLOAD_DIR / f"{image_id}_heatmap.png"
-        import numpy as np
-        prediction_array = np.array([[confidence_scores[label] for label in sorted(confidence_scores.keys())]])
-        create_heatmap(str(upload_path), prediction_array, str(heatmap_path))
+    try:
+        # Decode once for both the model input and the heatmap base
+        # (CPU-bound work runs in the thread pool to keep the event loop free)
+        preprocessed, heatmap_base = await asyncio.to_thread(preprocess_and_load, upload_path)
+
+        # Queue for batched prediction and wait for this image's result
+        if _batch_queue is None:
+            raise RuntimeError("Prediction worker is not running")
+        future = asyncio.get_running_loop().create_future()
+        await _batch_queue.put((preprocessed, future))
+        try:
+            result = await asyncio.wait_for(future, PREDICTION_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            raise RuntimeError("Timed out waiting for prediction")
+        confidence_scores, predicted_class, max_confidence, probabilities = result
+
+        # Create heatmap only when there is something to highlight; otherwise
+        # it would be an unchanged copy, so the original upload is served
+        if predicted_class != "healthy" and max_confidence > 0.5:
+            heatmap_path = f"{_UPLOAD_DIR_STR}/{image_id}_heatmap.jpg"
+            await asyncio.to_thread(create_heatmap, heatmap_base, probabilities, heatmap_path)
+            heatmap_url = f"/api/image/{image_id}_heatmap.jpg"
+        else:
+            heatmap_url = f"/api/image/{image_id}{file_ext}"
 
         # Prepare response
         response = PredictionResponse(
@@ -129,15 +162,14 @@ async def diagnose_image(file: UploadFile = File(...)):
             confidence_scores=confidence_scores,
             image_id=image_id,
             message=_get_diagnosis_message(predicted_class, max_confidence),
-            heatmap_url=f"/api/image/{image_id}_heatmap.png"
+            heatmap_url=heatmap_url
         )
 
         return response
 
     except Exception as e:
         # Clean up uploaded file on error
-        if upload_path.exists():
-            upload_path.unlink()
+        _remove_upload(upload_path)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing image: {str(e)}"
@@ -163,6 +195,121 @@ async def get_image(image_name: str):
     return FileResponse(image_path)
 
 
+def _save_upload(source: BinaryIO, upload_path: str, max_size: int):
+    """
+    Copy an upload to disk in chunks.
+
+    Copying stops after max_size + 1 bytes, which is enough for
+    validate_image to reject the file without writing all of it.
+
+    Args:
+        source: Uploaded file object
+        upload_path: Destination path
+        max_size: Maximum allowed file size in bytes
+    """
+    remaining = max_size + 1
+    with open(upload_path, "wb") as f:
+        while remaining > 0:
+            chunk = source.read(min(1 << 20, remaining))
+            if not chunk:
+                break
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+def _remove_upload(upload_path: str):
+    """Delete an upload, ignoring one that was never written."""
+    try:
+        os.unlink(upload_path)
+    except FileNotFoundError:
+        pass
+
+
+def start_batch_worker() -> asyncio.Task:
+    """
+    Start the prediction batching task on the running event loop.
+
+    A fresh queue is created on every start so that restarting the app in
+    the same process does not reuse a queue bound to a closed loop. When
+    the task ends for any reason, requests still queued are failed instead
+    of waiting forever.
+
+    Returns:
+        The worker task; cancel it to stop the worker
+    """
+    global _batch_queue
+    queue = asyncio.Queue()
+    _batch_queue = queue
+
+    def _on_worker_done(task: asyncio.Task):
+        global _batch_queue
+        if _batch_queue is queue:
+            _batch_queue = None
+
+        if task.cancelled():
+            error = RuntimeError("Prediction worker stopped")
+        else:
+            print(f"Prediction worker crashed: {task.exception()!r}")
+            error = RuntimeError("Prediction worker crashed")
+
+        while not queue.empty():
+            _, future = queue.get_nowait()
+            _fail_futures([future], error)
+
+    task = asyncio.create_task(_run_batch_worker(queue))
+    task.add_done_callback(_on_worker_done)
+    return task
+
+
+def _fail_futures(futures: List[asyncio.Future], error: Exception):
+    """Resolve still-pending prediction futures with an error."""
+    for future in futures:
+        if not future.done():
+            future.set_exception(error)
+
+
+async def _run_batch_worker(queue: asyncio.Queue):
+    """
+    Run queued diagnosis requests through the model in batches.
+
+    Waits for a request, then keeps collecting until MAX_BATCH_SIZE images
+    are queued or MAX_BATCH_WAIT_MS has passed, and resolves every request's
+    future from a single model call.
+
+    Args:
+        queue: Queue of (preprocessed_image, future) pairs
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch = [await queue.get()]
+
+        try:
+            deadline = loop.time() + MAX_BATCH_WAIT_MS / 1000
+
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            images = [image for image, _ in batch]
+            results = await asyncio.to_thread(get_model().predict_batch, images)
+        except asyncio.CancelledError:
+            _fail_futures([future for _, future in batch], RuntimeError("Prediction worker stopped"))
+            raise
+        except Exception as e:
+            _fail_futures([future for _, future in batch], e)
+            continue
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
 def _get_diagnosis_message(prediction: str, confidence: float) -> str:
     """
     Generate user-friendly diagnosis message.
@@ -174,20 +321,4 @@ def _get_diagnosis_message(prediction: str, confidence: float) -> str:
     Returns:
         Diagnosis message
     """
-    if prediction == "healthy":
-        if confidence > 0.8:
-            return "The dental X-ray appears healthy with no signs of cavities or gum disease."
-        else:
-            return "The dental X-ray appears mostly healthy, but consider a professional examination."
-    elif prediction == "cavity":
-        if confidence > 0.8:
-            return "Potential cavity detected. Please consult with a dentist for proper diagnosis and treatment."
-        else:
-            return "Possible cavity detected. Recommend professional dental examination for confirmation."
-    elif prediction == "gum_disease":
-        if confidence > 0.8:
-            return "Signs of gum disease detected. Please schedule an appointment with your dentist."
-        else:
-            return "Possible gum disease indicators. Recommend professional dental consultation."
-    else:
-        return "Analysis complete. Please consult with a dental professional for proper diagnosis."
+    return _DIAGNOSIS_MESSAGES.get((prediction, confidence > 0.8), _DEFAULT_DIAGNOSIS_MESSAGE)
@@ -1,9 +1,19 @@
 """Main FastAPI application for dental diagnosis."""
 
+import asyncio
+import os
+from app.config import ALLOWED_ORIGINS, INFERENCE_THREADS, IMAGE_SIZE
+
+# oneDNN/threading settings must be in place before TensorFlow is imported
+os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(INFERENCE_THREADS))
+os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+
+import numpy as np
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import ALLOWED_ORIGINS
-from app.routes.diagnosis import router as diagnosis_router
+from app.routes.diagnosis import router as diagnosis_router, start_batch_worker
+from app.models.dental_model import get_model
 
 # Create FastAPI app
 app = FastAPI(
@@ -25,6 +35,28 @@ app.add_middleware(
 app.include_router(diagnosis_router)
 
 
+@app.on_event("startup")
+async def warm_up_model():
+    """Load the model and run one inference so the first request is not slow."""
+    get_model().predict(np.zeros((1, *IMAGE_SIZE, 3), dtype=np.uint8))
+
+
+@app.on_event("startup")
+async def start_prediction_worker():
+    """Start the background task that batches model predictions."""
+    app.state.batch_worker = start_batch_worker()
+
+
+@app.on_event("shutdown")
+async def stop_prediction_worker():
+    """Stop the prediction batching task, failing any queued requests."""
+    app.state.batch_worker.cancel()
+    try:
+        await app.state.batch_worker
+    except asyncio.CancelledError:
+        pass
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -0,0 +1,46 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+
+class StubModel:
+    """Stands in for DentalDiagnosisModel and records each batch it is given."""
+
+    model = object()
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def predict_batch(self, images):
+        self.release.wait(timeout=5)
+        self.batch_sizes.append(len(images))
+        probabilities = np.array([0.1, 0.8, 0.1], dtype=np.float32)
+        scores = {"healthy": 0.1, "cavity": 0.8, "gum_disease": 0.1}
+        return [(scores, "cavity", 0.8, probabilities) for _ in images]
+
+    def predict(self, image):
+        return self.predict_batch([image])[0]
+
+
+@pytest.fixture
+def stub_model(monkeypatch, tmp_path):
+    # Imported here so tests that do not need the app do not load TensorFlow
+    import main
+    from app.routes import diagnosis
+
+    model = StubModel()
+    monkeypatch.setattr(main, "get_model", lambda: model)
+    monkeypatch.setattr(diagnosis, "get_model", lambda: model)
+    monkeypatch.setattr(diagnosis, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(diagnosis, "_UPLOAD_DIR_STR", str(tmp_path))
+    return model
+
+
+@pytest.fixture
+def xray_png():
+    img = np.random.default_rng(0).integers(0, 256, (300, 400, 3), dtype=np.uint8)
+    return cv2.imencode(".png", img)[1].tobytes()
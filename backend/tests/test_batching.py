@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from app.config import IMAGE_SIZE
+from app.routes import diagnosis
+
+
+def _diagnose(client, image):
+    return client.post("/api/diagnose", files={"file": ("xray.png", image, "image/png")})
+
+
+def test_serves_requests_across_app_restarts(stub_model, xray_png):
+    # The batch queue used to stay bound to the first event loop, so the
+    # second app start hung on its first request
+    for _ in range(2):
+        with TestClient(main.app) as client:
+            response = _diagnose(client, xray_png)
+            assert response.status_code == 200
+            assert response.json()["prediction"] == "cavity"
+
+
+def test_worker_restarts_on_a_new_event_loop(stub_model):
+    async def predict_once():
+        worker = diagnosis.start_batch_worker()
+        future = asyncio.get_running_loop().create_future()
+        await diagnosis._batch_queue.put((np.zeros((1, *IMAGE_SIZE, 3), dtype=np.uint8), future))
+        result = await asyncio.wait_for(future, 5)
+        worker.cancel()
+        return result
+
+    for _ in range(2):
+        assert asyncio.run(predict_once())[1] == "cavity"
+
+
+def test_concurrent_requests_share_a_batch(stub_model, xray_png):
+    with TestClient(main.app) as client:
+        stub_model.release.clear()
+        threads = [threading.Thread(target=_diagnose, args=(client, xray_png)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Let every request reach the queue while the first batch is blocked
+        threading.Timer(1.0, stub_model.release.set).start()
+        for thread in threads:
+            thread.join()
+
+    assert sum(stub_model.batch_sizes) == 5  # 4 requests + startup warm-up
+    assert max(stub_model.batch_sizes) > 1
+
+
+def test_failed_batch_does_not_stop_the_worker(stub_model, xray_png, monkeypatch):
+    with TestClient(main.app) as client:
+        with monkeypatch.context() as patch:
+            patch.setattr(stub_model, "predict_batch", _raise_prediction_error)
+            response = _diagnose(client, xray_png)
+        assert response.status_code == 500
+        assert "prediction failed" in response.json()["detail"]
+
+        assert _diagnose(client, xray_png).status_code == 200
+
+
+def _raise_prediction_error(images):
+    raise RuntimeError("prediction failed")
+
+
+def test_stopping_the_worker_fails_queued_requests(stub_model):
+    async def scenario():
+        stub_model.release.clear()
+        worker = diagnosis.start_batch_worker()
+        image = np.zeros((1, *IMAGE_SIZE, 3), dtype=np.uint8)
+        loop = asyncio.get_running_loop()
+
+        # One request is in the model call, the other still queued
+        in_flight = loop.create_future()
+        queued = loop.create_future()
+        await diagnosis._batch_queue.put((image, in_flight))
+        await asyncio.sleep(0.05)
+        await diagnosis._batch_queue.put((image, queued))
+
+        worker.cancel()
+        stub_model.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await worker
+
+        for future in (in_flight, queued):
+            with pytest.raises(RuntimeError, match="Prediction worker stopped"):
+                await asyncio.wait_for(future, 1)
+        assert diagnosis._batch_queue is None
+
+    asyncio.run(scenario())
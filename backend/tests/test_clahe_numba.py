@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from app.clahe_numba import CLIP_LIMIT, TILES, clahe_u8
+
+SHAPES = [(224, 224), (230, 301), (100, 100), (37, 53), (512, 389)]
+
+
+def _reference(img: np.ndarray) -> np.ndarray:
+    clahe = cv2.createCLAHE(clipLimit=CLIP_LIMIT, tileGridSize=(TILES, TILES))
+    return clahe.apply(np.ascontiguousarray(img))
+
+
+def _assert_matches_opencv(img: np.ndarray):
+    np.testing.assert_array_equal(clahe_u8(img), _reference(img))
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_matches_opencv(shape):
+    rng = np.random.default_rng(0)
+    _assert_matches_opencv(rng.integers(0, 256, shape, dtype=np.uint8))
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_matches_opencv_on_gradient(shape):
+    rows, cols = shape
+    img = (np.add.outer(np.arange(rows), np.arange(cols)) * 255 // (rows + cols)).astype(np.uint8)
+    _assert_matches_opencv(img)
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("channel", [0, 1, 2])
+def test_matches_opencv_on_channel_slice(shape, channel):
+    rng = np.random.default_rng(channel)
+    img = rng.integers(0, 256, (*shape, 3), dtype=np.uint8)
+    _assert_matches_opencv(img[:, :, channel])
+
+
+def test_does_not_modify_input():
+    img = np.random.default_rng(0).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    original = img.copy()
+    clahe_u8(img[:, :, 0])
+    np.testing.assert_array_equal(img, original)
+
+
+def test_concurrent_calls():
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)[:, :, 0] for _ in range(32)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(clahe_u8, images))
+    for img, result in zip(images, results):
+        np.testing.assert_array_equal(result, _reference(img))
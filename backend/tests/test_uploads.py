@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+
+import main
+from app.config import MAX_FILE_SIZE
+from app.routes import diagnosis
+
+
+def _diagnose(client, image, filename="xray.png"):
+    return client.post("/api/diagnose", files={"file": (filename, image, "image/png")})
+
+
+def test_failed_save_removes_partial_upload(stub_model, xray_png, monkeypatch, tmp_path):
+    def save_half_then_fail(source, upload_path, max_size):
+        with open(upload_path, "wb") as f:
+            f.write(source.read(100))
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(diagnosis, "_save_upload", save_half_then_fail)
+    with TestClient(main.app) as client:
+        response = _diagnose(client, xray_png)
+
+    assert response.status_code == 500
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_invalid_image_is_removed(stub_model, tmp_path):
+    with TestClient(main.app) as client:
+        response = _diagnose(client, b"not an image")
+
+    assert response.status_code == 400
+    assert str(tmp_path) not in response.json()["detail"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_oversized_upload_is_rejected(stub_model, tmp_path):
+    with TestClient(main.app) as client:
+        response = _diagnose(client, b"\0" * (MAX_FILE_SIZE + 1))
+
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unsupported_extension_is_rejected(stub_model, xray_png, tmp_path):
+    with TestClient(main.app) as client:
+        response = _diagnose(client, xray_png, filename="xray.gif")
+
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []